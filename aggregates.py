@@ -0,0 +1,120 @@
+"""Per-team and per-judge score aggregates kept in process.
+
+Each worker keeps its own copy and brings it up to date by applying the rows
+written since the last revision it saw, so a ranking never rescans the score
+table once the first request of a worker has loaded it.
+"""
+import math
+import threading
+
+
+class ScoreAggregates:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        # Revision of the last applied change; None until the first load
+        self.revision = None
+        self.by_team = {}      # team -> {judge: score}
+        self.by_judge = {}     # judge -> {team: score}
+        self.team_stats = {}   # team -> [total, min, max]
+        self.judge_stats = {}  # judge -> [count, total, total of squares]
+        self.team_z = {}       # team -> sum of the judge-normalized scores
+        self._ranked = {}
+
+    def sync(self, revision, fetch, reset_revision=0):
+        # fetch(since) returns (judge, team, score) rows written after `since`,
+        # or every row when `since` is None
+        with self.lock:
+            if self.revision is not None and revision <= self.revision:
+                return
+            if self.revision is not None and reset_revision > self.revision:
+                # Scores were cleared since the last sync; deltas cannot express that
+                self.reset()
+            self.apply(fetch(self.revision))
+            self.revision = revision
+
+    def apply(self, rows):
+        rows = [(judge, team, score) for judge, team, score in rows if score is not None]
+        judges = {judge for judge, _, _ in rows}
+        # A judge's mean and spread move with every score they give, so take
+        # their normalized contributions out before the update and put them back after
+        for judge in judges:
+            self._add_z(judge, -1)
+        for judge, team, score in rows:
+            self._set(judge, team, score)
+        for judge in judges:
+            self._add_z(judge, 1)
+        self._ranked = {}
+
+    def _set(self, judge, team, score):
+        judged = self.by_judge.setdefault(judge, {})
+        scores = self.by_team.setdefault(team, {})
+        judge_stats = self.judge_stats.setdefault(judge, [0, 0.0, 0.0])
+        old = judged.get(team)
+        if old is not None:
+            judge_stats[0] -= 1
+            judge_stats[1] -= old
+            judge_stats[2] -= old * old
+        judged[team] = score
+        scores[judge] = score
+        judge_stats[0] += 1
+        judge_stats[1] += score
+        judge_stats[2] += score * score
+
+        stats = self.team_stats.get(team)
+        if stats is None:
+            self.team_stats[team] = [score, score, score]
+            self.team_z.setdefault(team, 0.0)
+            return
+        stats[0] += score - (old if old is not None else 0)
+        if old is not None and old in (stats[1], stats[2]):
+            # The replaced score may have been the extreme; rescan this team only
+            stats[1] = min(scores.values())
+            stats[2] = max(scores.values())
+        else:
+            stats[1] = min(stats[1], score)
+            stats[2] = max(stats[2], score)
+
+    def _add_z(self, judge, sign):
+        judged = self.by_judge.get(judge)
+        if not judged:
+            return
+        count, total, total_sq = self.judge_stats[judge]
+        mean = total / count
+        std = math.sqrt(max(total_sq / count - mean * mean, 0.0))
+        # A judge who gives everyone the same score carries no ranking signal
+        if std < 1e-9:
+            return
+        for team, score in judged.items():
+            self.team_z[team] += sign * (score - mean) / std
+
+    def coverage(self, judge, teams):
+        # Judgment count per team, and the teams this judge has already scored
+        with self.lock:
+            counts = {team: len(self.by_team.get(team, ())) for team in teams}
+            return counts, set(self.by_judge.get(judge, ()))
+
+    def ranking(self, sort='mean'):
+        with self.lock:
+            return self._ranking(sort)
+
+    def _ranking(self, sort):
+        if sort not in self._ranked:
+            entries = []
+            for team, (total, low, high) in self.team_stats.items():
+                count = len(self.by_team[team])
+                entries.append({
+                    "team": team,
+                    "mean": total / count,
+                    "count": count,
+                    "min": low,
+                    "max": high,
+                    "normalized": self.team_z[team] / count,
+                })
+            entries.sort(key=lambda entry: (-entry[sort], entry["team"]))
+            for rank, entry in enumerate(entries, 1):
+                entry["rank"] = rank
+            self._ranked[sort] = entries
+        return self._ranked[sort]
@@ -1,18 +1,42 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 import os
+import codecs
+import csv
+import io
+import itertools
 from dotenv import load_dotenv
 import psycopg2
 import logging
-from sqlalchemy import text
+import json
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import text, inspect, func, event
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.dialects import postgresql, sqlite
+from werkzeug.http import is_resource_modified
+from aggregates import ScoreAggregates
+from assets import StaticAssets, negotiate
+from broker import EventBroker, PostgresListener, TooManySubscribers, stream
+import metrics
+import scheduler
+
+# Load environment variables from the .env file
+load_dotenv()
 
 # Set up logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
-# Load environment variables from the .env file
-load_dotenv()
+# Share of hot-path events logged at INFO; DEBUG logs all of them
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.01'))
+
+def log_event(name, **fields):
+    # Gate before formatting so unsampled requests pay almost nothing
+    if logger.isEnabledFor(logging.DEBUG) or (
+            logger.isEnabledFor(logging.INFO) and random.random() < LOG_SAMPLE_RATE):
+        logger.info(json.dumps({"event": name, **fields}, default=str))
 
 # Get the database URL from environment
 DATABASE_URL = os.getenv('DATABASE_URL')
@@ -20,15 +44,38 @@ if not DATABASE_URL:
     logger.error("DATABASE_URL environment variable is not set")
     raise ValueError("DATABASE_URL environment variable is not set")
 
-logger.info(f"Connecting to database...")
-
-app = Flask(__name__, static_folder='static', static_url_path='')
+# static/ is served by the asset layer below rather than Flask's static route
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+app = Flask(__name__, static_folder=None)
 CORS(app, supports_credentials=True)
+metrics.init_app(app)
 
 # Configure the database
 app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL.replace('postgres://', 'postgresql://')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+def engine_options(uri):
+    # SQLite's default pools take none of the sizing options
+    if uri.startswith('sqlite'):
+        return {}
+    options = {
+        "pool_size": int(os.getenv('DB_POOL_SIZE', '10')),
+        "max_overflow": int(os.getenv('DB_MAX_OVERFLOW', '10')),
+        "pool_timeout": int(os.getenv('DB_POOL_TIMEOUT', '10')),
+        # Drop connections the server or a proxy closed while idle
+        "pool_pre_ping": True,
+        "pool_recycle": int(os.getenv('DB_POOL_RECYCLE', '1800')),
+    }
+    # Hosted Postgres (e.g. RDS) requires TLS unless told otherwise
+    sslmode = os.getenv('DB_SSLMODE') or ('require' if 'amazonaws.com' in uri else None)
+    if sslmode:
+        options["connect_args"] = {"sslmode": sslmode}
+    return options
+
+# The engine connects on first use, so importing the app (including under
+# gunicorn --preload) never touches the database
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
 # Initialize database
 db = SQLAlchemy(app)
 
@@ -39,6 +86,8 @@ class Score(db.Model):
     team = db.Column(db.String(80), nullable=False, index=True)
     score = db.Column(db.Float, nullable=True)
     timestamp = db.Column(db.DateTime, nullable=True)
+    # Value of ScoreRevision when this row was last written
+    revision = db.Column(db.BigInteger, nullable=True, index=True)
     
     # Add unique constraint to prevent duplicate scores
     __table_args__ = (
@@ -51,52 +100,525 @@ class Score(db.Model):
         self.score = score
         self.timestamp = None
 
-# Test the connection
-try:
+# Single-row counter bumped by every score write. The UPDATE holds the row lock
+# until commit, so revisions become visible in increasing order.
+class ScoreRevision(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    # Revision of the last clear; readers behind it must drop what they hold
+    reset_revision = db.Column(db.BigInteger, nullable=False, default=0)
+
+# Judges added before scoring anyone; judges with scores come from the score table
+class Judge(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), nullable=False, unique=True)
+    # Revision of the judge event, so /api/stream can replay it
+    revision = db.Column(db.BigInteger, nullable=False, index=True)
+
+# A judge's hold on a batch of teams, counted as coverage until it expires
+class Reservation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    judge = db.Column(db.String(80), nullable=False, index=True)
+    team = db.Column(db.String(80), nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('judge', 'team', name='unique_reservation'),
+    )
+
+def ensure_schema():
+    # Create tables if they don't exist
+    db.create_all()
+    # create_all does not alter existing tables
+    columns = {column['name'] for column in inspect(db.engine).get_columns('score')}
+    revision_columns = {column['name'] for column in inspect(db.engine).get_columns('score_revision')}
+    with db.engine.begin() as conn:
+        if 'revision' not in columns:
+            conn.execute(text("ALTER TABLE score ADD COLUMN revision BIGINT"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_score_revision ON score (revision)"))
+        if 'reset_revision' not in revision_columns:
+            conn.execute(text("ALTER TABLE score_revision ADD COLUMN reset_revision BIGINT NOT NULL DEFAULT 0"))
+    try:
+        with db.engine.begin() as conn:
+            if conn.execute(text("SELECT 1 FROM score_revision WHERE id = 1")).first() is None:
+                conn.execute(ScoreRevision.__table__.insert().values(
+                    id=1, value=0, updated_at=datetime.utcnow(), reset_revision=0))
+    except IntegrityError:
+        # Another worker seeded it first
+        pass
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create missing tables and columns."""
+    ensure_schema()
+    logger.info("Database schema is up to date")
+
+# Rows per multi-VALUES upsert; keeps SQLite under its bound-parameter limit
+UPSERT_CHUNK_SIZE = 300
+
+class InvalidScore(ValueError):
+    pass
+
+def parse_score(data):
+    if not isinstance(data, dict) or not all(key in data for key in ['judge', 'team', 'score']):
+        raise InvalidScore("Missing required data")
+    try:
+        score = float(data['score'])
+    except (TypeError, ValueError):
+        raise InvalidScore("Invalid score value")
+    # Validate score range
+    if not (0 <= score <= 3):
+        raise InvalidScore("Score must be between 0 and 3")
+    return {"judge": data['judge'], "team": data['team'], "score": score}
+
+def next_revision():
+    now = datetime.utcnow()
+    stmt = ScoreRevision.__table__.update().where(ScoreRevision.id == 1).values(
+        value=ScoreRevision.value + 1, updated_at=now)
+    if db.engine.dialect.name == 'postgresql':
+        return db.session.execute(stmt.returning(ScoreRevision.value)).scalar(), now
+    db.session.execute(stmt)
+    return db.session.query(ScoreRevision.value).filter_by(id=1).scalar(), now
+
+def current_revision():
+    state = db.session.query(ScoreRevision.value, ScoreRevision.updated_at,
+                             ScoreRevision.reset_revision).filter_by(id=1).first()
+    return state if state else (0, None, 0)
+
+# Leaderboard aggregates for this worker, caught up to the revision counter on read
+aggregates = ScoreAggregates()
+
+def sync_aggregates(revision, reset_revision):
+    def fetch(since):
+        query = db.session.query(Score.judge, Score.team, Score.score)
+        if since is not None:
+            query = query.filter(Score.revision > since, Score.revision <= revision)
+        return query.all()
+    aggregates.sync(revision, fetch, reset_revision)
+
+# TCP keepalives on the LISTEN connection. It is idle between notifications, so
+# without them a connection a NAT or proxy dropped silently is never noticed.
+LISTENER_KEEPALIVES = {"keepalives": 1, "keepalives_idle": 30, "keepalives_interval": 10,
+                       "keepalives_count": 3}
+
+def listener_connection():
+    # A dedicated connection outside the pool, with the engine's URL and TLS settings
+    cargs, cparams = db.engine.dialect.create_connect_args(db.engine.url)
+    cparams.update(app.config['SQLALCHEMY_ENGINE_OPTIONS'].get('connect_args', {}))
+    cparams.update(LISTENER_KEEPALIVES)
+    return psycopg2.connect(*cargs, **cparams)
+
+# Live events for /api/stream. Postgres fans writes out to every worker through
+# NOTIFY; elsewhere the committing process publishes to its own broker.
+EVENT_CHANNEL = 'score_events'
+# NOTIFY rejects payloads of 8000 bytes or more
+NOTIFY_PAYLOAD_LIMIT = 7500
+# Replaying more than this on resume is slower than refetching /api/scores
+STREAM_REPLAY_LIMIT = 1000
+STREAM_HEARTBEAT_SECONDS = int(os.getenv('STREAM_HEARTBEAT_SECONDS', '15'))
+STREAM_MAX_AGE_SECONDS = int(os.getenv('STREAM_MAX_AGE_SECONDS', '300'))
+# An open stream holds a gunicorn thread (see gunicorn.conf.py) until it ends, so
+# streams get every thread but API_RESERVED_THREADS and the rest are refused with
+# a 503. A worker serves GUNICORN_THREADS - API_RESERVED_THREADS scoreboards.
+API_RESERVED_THREADS = int(os.getenv('API_RESERVED_THREADS', '8'))
+STREAM_MAX_SUBSCRIBERS = int(os.getenv('STREAM_MAX_SUBSCRIBERS', str(
+    max(1, int(os.getenv('GUNICORN_THREADS', '16')) - API_RESERVED_THREADS))))
+
+broker = EventBroker(max_subscribers=STREAM_MAX_SUBSCRIBERS)
+
+def score_events(rows):
+    events = {}
+    for revision, judge, team, score in rows:
+        event = events.setdefault(revision, {"id": revision, "type": "scores",
+                                             "data": {"revision": revision, "scores": []}})
+        event["data"]["scores"].append({"judge": judge, "team": team, "score": score})
+    return list(events.values())
+
+def expand_event(event):
+    # Oversized score events arrive without their rows; read them back by revision
+    if event["type"] == "scores" and "scores" not in event["data"]:
+        with app.app_context():
+            rows = db.session.query(Score.revision, Score.judge, Score.team, Score.score).filter(
+                Score.revision == event["id"]).all()
+        # Rows already overwritten or cleared cannot be rebuilt; have clients refetch
+        event = (score_events(rows) or [{"id": event["id"], "type": "resync",
+                                         "data": {"revision": event["id"]}}])[0]
+    return event
+
+def judge_events(rows):
+    return [{"id": revision, "type": "judge", "data": {"judge": name}} for revision, name in rows]
+
+def resync_event():
+    # Sent after the listener reconnects, since NOTIFYs in the gap are gone
     with app.app_context():
-        db.engine.connect()
-        # Create tables if they don't exist
-        db.create_all()
-        # Verify no automatic score creation
-        initial_scores = Score.query.all()
-        if initial_scores:
-            logger.info(f"Found {len(initial_scores)} initial scores")
-    logger.info("Database connection successful!")
-except Exception as e:
-    logger.error(f"Error connecting to database: {str(e)}")
-    raise
-
-def get_db_connection():
-    if 'amazonaws.com' in DATABASE_URL:
-        conn = psycopg2.connect(DATABASE_URL, sslmode='require')
+        revision = current_revision()[0]
+    return {"id": revision, "type": "resync", "data": {"revision": revision}}
+
+listener = PostgresListener(broker, listener_connection, EVENT_CHANNEL, expand=expand_event,
+                            resync=resync_event)
+
+def announce(event_type, revision, data):
+    event = {"id": revision, "type": event_type, "data": data}
+    if db.engine.dialect.name == 'postgresql':
+        # Delivered by Postgres only if and when the transaction commits
+        payload = json.dumps(event)
+        if len(payload) > NOTIFY_PAYLOAD_LIMIT:
+            payload = json.dumps({"id": revision, "type": event_type, "data": {"revision": revision}})
+        db.session.execute(text("SELECT pg_notify(:channel, :payload)"),
+                           {"channel": EVENT_CHANNEL, "payload": payload})
+    else:
+        db.session.info.setdefault('events', []).append(event)
+
+@event.listens_for(db.session, 'after_commit')
+def publish_committed_events(session):
+    for committed in session.info.pop('events', []):
+        broker.publish(committed)
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_rolled_back_events(session):
+    session.info.pop('events', None)
+
+ASSIGNMENT_TTL = timedelta(seconds=int(os.getenv('ASSIGNMENT_TTL_SECONDS', '900')))
+# Postgres advisory lock key serializing reservations across workers
+ASSIGNMENT_LOCK_KEY = 4640
+
+def reserve_teams(judge, teams):
+    now = datetime.utcnow()
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ASSIGNMENT_LOCK_KEY})
+    # On SQLite this first write takes the database write lock for the transaction
+    Reservation.query.filter(Reservation.expires_at <= now).delete(synchronize_session=False)
+
+    # Reservations are read before scores: a score committing in between is then
+    # counted twice rather than not at all
+    held = [team for (team,) in db.session.query(Reservation.team).filter_by(judge=judge)]
+    reserved = db.session.query(Reservation.team, func.count()).filter(
+        Reservation.judge != judge, Reservation.team.in_(teams)).group_by(Reservation.team).all()
+    revision, _, reset_revision = current_revision()
+    sync_aggregates(revision, reset_revision)
+    counts, seen = aggregates.coverage(judge, teams)
+
+    held = [team for team in held if team in counts and team not in seen]
+    if held:
+        # Hand back the batch this judge already holds rather than reshuffling it
+        assigned = sorted(held, key=scheduler.team_number)
+    else:
+        for team, count in reserved:
+            counts[team] += count
+        assigned = scheduler.pick_teams(teams, counts, seen)
+
+    expires_at = now + ASSIGNMENT_TTL
+    Reservation.query.filter_by(judge=judge).delete(synchronize_session=False)
+    db.session.add_all([Reservation(judge=judge, team=team, expires_at=expires_at) for team in assigned])
+    return assigned, expires_at
+
+def upsert_scores(rows):
+    revision, now = next_revision()
+    # Later rows win, and ON CONFLICT cannot touch the same row twice in one statement
+    rows = [dict(row, revision=revision, timestamp=now)
+            for row in {(row['judge'], row['team']): row for row in rows}.values()]
+    # Scored teams no longer hold a reservation
+    teams_by_judge = {}
+    for row in rows:
+        teams_by_judge.setdefault(row['judge'], []).append(row['team'])
+    for judge, teams in teams_by_judge.items():
+        Reservation.query.filter(Reservation.judge == judge, Reservation.team.in_(teams)).delete(
+            synchronize_session=False)
+    announce('scores', revision, {
+        "revision": revision,
+        "scores": [{"judge": row['judge'], "team": row['team'], "score": row['score']} for row in rows]
+    })
+    write_scores(rows)
+    return revision
+
+def score_upsert(rows=None):
+    # INSERT ... ON CONFLICT (judge, team) DO UPDATE, or None where the dialect has no upsert.
+    # Without rows the statement is left for executemany.
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        insert = postgresql.insert(Score.__table__)
+        conflict = {"constraint": 'unique_judge_team'}
+    elif dialect == 'sqlite':
+        insert = sqlite.insert(Score.__table__)
+        conflict = {"index_elements": ['judge', 'team']}
+    else:
+        return None
+    if rows is not None:
+        insert = insert.values(rows)
+    return insert.on_conflict_do_update(set_={
+        "score": insert.excluded.score,
+        "timestamp": insert.excluded.timestamp,
+        "revision": insert.excluded.revision,
+    }, **conflict)
+
+def write_scores(rows):
+    # Rows carry their revision and timestamp, at most one per (judge, team)
+    if score_upsert() is None:
+        for row in rows:
+            score_obj = Score.query.filter_by(judge=row['judge'], team=row['team']).first()
+            if not score_obj:
+                score_obj = Score(judge=row['judge'], team=row['team'])
+                db.session.add(score_obj)
+            score_obj.score = row['score']
+            score_obj.timestamp = row['timestamp']
+            score_obj.revision = row['revision']
+        return
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        db.session.execute(score_upsert(rows[start:start + UPSERT_CHUNK_SIZE]))
+
+# Rows per COPY read or executemany batch when importing
+IMPORT_BATCH_SIZE = 1000
+# Rows per server-side cursor fetch when exporting
+EXPORT_BATCH_SIZE = 1000
+
+def iter_lines(stream, chunk_size=65536):
+    # Only read() is required, which is all some servers' input streams offer.
+    # utf-8-sig drops the byte order mark Excel puts at the start of its CSVs.
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    pending = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        try:
+            decoded = decoder.decode(chunk, final=not chunk)
+        except UnicodeDecodeError:
+            raise InvalidScore("Upload is not valid UTF-8")
+        *lines, pending = (pending + decoded).split('\n')
+        for line in lines:
+            yield line + '\n'
+        if not chunk:
+            if pending:
+                yield pending
+            return
+
+def read_import(stream, fmt):
+    # Yields (line number, row) from a judge,team,score or exported team x judge
+    # upload, as CSV or NDJSON, without reading the whole body
+    text = iter_lines(stream)
+    if fmt == 'ndjson':
+        for line, raw in enumerate(text, 1):
+            if not raw.strip():
+                continue
+            try:
+                item = json.loads(raw)
+            except ValueError:
+                raise InvalidScore(f"Line {line}: Invalid JSON")
+            if isinstance(item, dict) and isinstance(item.get('scores'), dict) and 'team' in item:
+                for judge, score in item['scores'].items():
+                    if score is not None:
+                        yield line, {"judge": judge, "team": item['team'], "score": score}
+            else:
+                yield line, item
+        return
+
+    reader = csv.reader(text)
+    try:
+        yield from read_csv(reader)
+    except csv.Error as e:
+        raise InvalidScore(f"Line {reader.line_num}: {str(e)}")
+
+def read_csv(reader):
+    header = [column.strip() for column in next(reader, [])]
+    if {'judge', 'team', 'score'} <= set(header):
+        judge, team, score = (header.index(column) for column in ('judge', 'team', 'score'))
+        for line, record in enumerate(reader, 2):
+            if record:
+                try:
+                    yield line, {"judge": record[judge], "team": record[team], "score": record[score]}
+                except IndexError:
+                    raise InvalidScore(f"Line {line}: Missing required data")
+    elif header and header[0] == 'team' and not {'judge', 'score'} & set(header):
+        judges = header[1:-1] if header[-1] == 'average' else header[1:]
+        for line, record in enumerate(reader, 2):
+            for judge, value in zip(judges, record[1:]):
+                if value.strip():
+                    yield line, {"judge": judge, "team": record[0], "score": value}
+    elif header:
+        raise InvalidScore("CSV header must be judge,team,score or team,<judges>")
+
+def validated_rows(items, counter):
+    for line, item in items:
+        try:
+            row = parse_score(item)
+        except InvalidScore as e:
+            raise InvalidScore(f"Line {line}: {str(e)}")
+        counter[0] += 1
+        yield row
+
+class CopySource:
+    # File-like CSV view of rows for COPY ... FROM STDIN, filled as Postgres reads
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.pending = ''
+        # psycopg2 replaces exceptions raised in read() with QueryCanceled, so
+        # they are kept here and raised again once COPY returns
+        self.error = None
+
+    def read(self, size=-1):
+        size = size if size and size > 0 else 65536
+        while len(self.pending) < size:
+            try:
+                batch = list(itertools.islice(self.rows, IMPORT_BATCH_SIZE))
+            except Exception as e:
+                self.error = e
+                return ''
+            if not batch:
+                break
+            self.writer.writerows((row['judge'], row['team'], row['score']) for row in batch)
+            self.pending += self.buffer.getvalue()
+            self.buffer.seek(0)
+            self.buffer.truncate()
+        chunk, self.pending = self.pending[:size], self.pending[size:]
+        return chunk
+
+def import_scores(rows, counter):
+    # Returns the import's revision, or None when there was nothing to import
+    if db.engine.dialect.name == 'postgresql':
+        # COPY into a staging table, then merge in one statement; seq makes the
+        # last occurrence of a pair win. The revision, whose row lock every write
+        # waits on, is only taken for the merge, not while the upload streams in.
+        db.session.execute(text(
+            "CREATE TEMP TABLE score_import (seq BIGSERIAL, judge VARCHAR(80), team VARCHAR(80), "
+            "score DOUBLE PRECISION) ON COMMIT DROP"))
+        source = CopySource(rows)
+        with db.session.connection().connection.cursor() as cur:
+            cur.copy_expert("COPY score_import (judge, team, score) FROM STDIN WITH (FORMAT csv)", source)
+        if source.error:
+            raise source.error
+        if not counter[0]:
+            return None
+        revision, now = next_revision()
+        db.session.execute(text(
+            "INSERT INTO score (judge, team, score, timestamp, revision) "
+            "SELECT DISTINCT ON (judge, team) judge, team, score, :now, :revision "
+            "FROM score_import ORDER BY judge, team, seq DESC "
+            "ON CONFLICT ON CONSTRAINT unique_judge_team DO UPDATE SET score = EXCLUDED.score, "
+            "timestamp = EXCLUDED.timestamp, revision = EXCLUDED.revision"),
+            {"now": now, "revision": revision})
     else:
-        conn = psycopg2.connect(DATABASE_URL)
-    return conn
+        # SQLite holds its database-wide write lock from the first write to commit
+        # regardless, so the revision is taken as soon as there is a row to write
+        stmt = score_upsert()
+        revision = None
+        while True:
+            batch = list(itertools.islice(rows, IMPORT_BATCH_SIZE))
+            if not batch:
+                break
+            if revision is None:
+                revision, now = next_revision()
+            batch = [dict(row, revision=revision, timestamp=now) for row in batch]
+            if stmt is None:
+                write_scores(list({(row['judge'], row['team']): row for row in batch}.values()))
+            else:
+                db.session.execute(stmt, batch)
+        if revision is None:
+            return None
+    # Imported teams no longer hold a reservation for their judge
+    db.session.execute(text(
+        "DELETE FROM reservation WHERE EXISTS (SELECT 1 FROM score WHERE score.judge = reservation.judge "
+        "AND score.team = reservation.team AND score.revision = :revision)"), {"revision": revision})
+    return revision
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    body, content_type = metrics.render()
+    return app.response_class(body, content_type=content_type)
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    try:
+        db.session.execute(text("SELECT 1"))
+        return jsonify({"status": "ok"})
+    except Exception as e:
+        logger.error(f"Health check failed: {str(e)}")
+        return jsonify({"status": "unavailable", "error": str(e)}), 503
 
 # API Routes
 @app.route('/api/scores', methods=['GET'])
 def get_scores():
     try:
-        logger.info("Fetching scores...")
-        with app.app_context():
-            scores = Score.query.all()
+        since = request.args.get('since', type=int)
+        if 'since' in request.args and since is None:
+            return jsonify({"error": "Invalid since cursor"}), 400
+        
+        # Answer unchanged datasets from the revision counter alone. Only the ETag
+        # decides: HTTP dates cannot tell apart two writes in the same second, so
+        # Last-Modified is sent for information and If-Modified-Since is ignored.
+        revision, updated_at, reset_revision = current_revision()
+        etag = f"scores-{revision}"
+        # A cursor from before the last clear cannot be continued
+        reset = since is not None and since < reset_revision
+        if not is_resource_modified(request.environ, etag=etag):
+            response = app.response_class(status=304)
+        else:
+            if since is None or reset:
+                scores = Score.query.all()
+            else:
+                scores = Score.query.filter(Score.revision > since, Score.revision <= revision).all()
             scores_data = [{"judge": score.judge, "team": score.team, "score": score.score} for score in scores]
-            logger.info(f"Found {len(scores_data)} scores")
-            return jsonify(scores_data)
+            log_event("scores_fetched", since=since, count=len(scores_data))
+            if since is None:
+                # Keep the full response a bare list; the cursor travels in a header
+                response = jsonify(scores_data)
+            else:
+                response = jsonify({"scores": scores_data, "cursor": revision, "reset": reset})
+        
+        response.set_etag(etag)
+        if updated_at:
+            response.last_modified = updated_at
+        response.headers['X-Score-Cursor'] = str(revision)
+        response.cache_control.no_cache = True
+        return response
     except Exception as e:
         logger.error(f"Error fetching scores: {str(e)}")
         logger.error(f"Error type: {type(e).__name__}")
         logger.error(f"Error details: {str(e.__dict__)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/leaderboard', methods=['GET'])
+def get_leaderboard():
+    try:
+        sort = request.args.get('sort', 'mean')
+        if sort not in ('mean', 'normalized'):
+            return jsonify({"error": "sort must be mean or normalized"}), 400
+        limit = request.args.get('limit', type=int)
+        offset = request.args.get('offset', 0, type=int)
+        if ('limit' in request.args and (limit is None or limit < 0)) or offset is None or offset < 0:
+            return jsonify({"error": "Invalid limit or offset"}), 400
+        
+        # ETag-only revalidation, as for /api/scores
+        revision, updated_at, reset_revision = current_revision()
+        etag = f"leaderboard-{revision}"
+        if not is_resource_modified(request.environ, etag=etag):
+            response = app.response_class(status=304)
+        else:
+            sync_aggregates(revision, reset_revision)
+            ranking = aggregates.ranking(sort)
+            end = offset + limit if limit is not None else None
+            response = jsonify({
+                "teams": ranking[offset:end],
+                "total": len(ranking),
+                "revision": revision
+            })
+        
+        response.set_etag(etag)
+        if updated_at:
+            response.last_modified = updated_at
+        response.cache_control.no_cache = True
+        return response
+    except Exception as e:
+        logger.error(f"Error building leaderboard: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/judges', methods=['GET'])
 def get_judges():
     try:
-        logger.info("Fetching judges...")
-        # Get unique judges from the scores table
-        judges = db.session.query(Score.judge).distinct().all()
+        # Judges with scores plus those added before scoring anyone
+        judges = db.session.query(Score.judge).union(db.session.query(Judge.name)).all()
         judges_list = [judge[0] for judge in judges]
-        logger.info(f"Found {len(judges_list)} judges")
+        log_event("judges_fetched", count=len(judges_list))
         return jsonify(judges_list)
     except Exception as e:
         logger.error(f"Error fetching judges: {str(e)}")
@@ -108,20 +630,28 @@ def get_judges():
 def add_judge():
     try:
         data = request.get_json()
-        logger.info(f"Received data for new judge: {data}")
         if not data or 'judge' not in data:
             return jsonify({"error": "Missing judge"}), 400
             
         judge_id = data['judge']
         
         # Check if judge already exists
-        existing_judge = db.session.query(Score.judge).filter_by(judge=judge_id).first()
+        existing_judge = db.session.query(Score.judge).filter_by(judge=judge_id).first() or \
+            Judge.query.filter_by(name=judge_id).first()
         if existing_judge:
             return jsonify({"error": "Judge already exists"}), 400
             
-        # Just return success - no need to create any database entries
-        return jsonify({"message": "Judge added successfully"}), 201
+        # Its own revision gives the event a unique id to resume from
+        revision, _ = next_revision()
+        db.session.add(Judge(name=judge_id, revision=revision))
+        announce('judge', revision, {"judge": judge_id})
+        db.session.commit()
+        log_event("judge_added", judge=judge_id, revision=revision)
+        return jsonify({"message": "Judge added successfully", "revision": revision}), 201
         
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "Judge already exists"}), 400
     except Exception as e:
         logger.error(f"Error adding judge: {str(e)}")
         db.session.rollback()
@@ -131,43 +661,213 @@ def add_judge():
 def submit_score():
     try:
         data = request.get_json()
-        logger.info(f"Received score data: {data}")
         
-        if not data or not all(key in data for key in ['judge', 'team', 'score']):
+        row = parse_score(data)
+        revision = upsert_scores([row])
+        db.session.commit()
+        log_event("score_submitted", judge=row['judge'], team=row['team'], revision=revision)
+        
+        return jsonify({
+            "message": "Score submitted successfully!",
+            "score": row,
+            "revision": revision
+        }), 201
+    
+    except InvalidScore as e:
+        logger.error(f"Invalid score data: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error submitting score: {str(e)}")
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/scores/batch', methods=['POST'])
+def submit_scores_batch():
+    try:
+        data = request.get_json()
+        
+        # Accept either a bare list of rows or {"scores": [...]}
+        if isinstance(data, dict):
+            data = data.get('scores')
+        if not isinstance(data, list) or not data:
             return jsonify({"error": "Missing required data"}), 400
         
-        judge_id = data['judge']
-        team_id = data['team']
-        score = float(data['score'])
+        # Validate every row before writing any of them
+        rows = []
+        for index, item in enumerate(data):
+            try:
+                rows.append(parse_score(item))
+            except InvalidScore as e:
+                return jsonify({"error": str(e), "index": index}), 400
         
-        # Validate score range
-        if not (0 <= score <= 3):
-            return jsonify({"error": "Score must be between 0 and 3"}), 400
+        revision = upsert_scores(rows)
+        db.session.commit()
+        log_event("scores_submitted", count=len(rows), revision=revision)
         
-        # Use upsert to handle both insert and update efficiently
-        score_obj = Score.query.filter_by(judge=judge_id, team=team_id).first()
-        if score_obj:
-            score_obj.score = score
-        else:
-            score_obj = Score(judge=judge_id, team=team_id, score=score)
-            db.session.add(score_obj)
+        return jsonify({
+            "message": "Scores submitted successfully!",
+            "count": len(rows),
+            "revision": revision
+        }), 201
+    
+    except Exception as e:
+        logger.error(f"Error submitting scores: {str(e)}")
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/assignments/next', methods=['POST'])
+def next_assignment():
+    try:
+        data = request.get_json(silent=True) or {}
+        judge = request.args.get('judge') or data.get('judge')
+        if not judge:
+            return jsonify({"error": "Missing judge"}), 400
+        
+        # Team range as configured in the client, defaulting to the client's default
+        start = request.args.get('start', data.get('start', 51), type=int)
+        end = request.args.get('end', data.get('end', 99), type=int)
+        if start is None or end is None or start < 1 or end < start:
+            return jsonify({"error": "Invalid team range"}), 400
         
+        teams, expires_at = reserve_teams(judge, scheduler.team_range(start, end))
         db.session.commit()
         
         return jsonify({
-            "message": "Score submitted successfully!",
-            "score": {
-                "judge": judge_id,
-                "team": team_id,
-                "score": score
-            }
+            "judge": judge,
+            "teams": teams,
+            "expires_at": expires_at.isoformat() + 'Z'
+        })
+    
+    except Exception as e:
+        logger.error(f"Error assigning teams: {str(e)}")
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/stream', methods=['GET'])
+def stream_updates():
+    try:
+        last_id = request.headers.get('Last-Event-ID', request.args.get('lastEventId'))
+        try:
+            last_id = int(last_id) if last_id is not None else None
+        except ValueError:
+            return jsonify({"error": "Invalid Last-Event-ID"}), 400
+        
+        if db.engine.dialect.name == 'postgresql':
+            listener.start()
+        try:
+            subscription, replay = broker.subscribe(last_id)
+        except TooManySubscribers:
+            response = jsonify({"error": "Too many open streams"})
+            response.headers['Retry-After'] = '30'
+            return response, 503
+        
+        if replay is None:
+            # The broker's buffer does not reach back that far; replay from the table.
+            # Subscribing first means nothing committed in between is missed.
+            try:
+                revision, _, reset_revision = current_revision()
+                rows = db.session.query(Score.revision, Score.judge, Score.team, Score.score).filter(
+                    Score.revision > last_id).order_by(Score.revision).limit(STREAM_REPLAY_LIMIT + 1).all()
+                judges = db.session.query(Judge.revision, Judge.name).filter(
+                    Judge.revision > last_id).order_by(Judge.revision).limit(STREAM_REPLAY_LIMIT + 1).all()
+            except Exception:
+                broker.unsubscribe(subscription)
+                raise
+            if len(rows) + len(judges) > STREAM_REPLAY_LIMIT or last_id < reset_revision:
+                replay = [{"id": revision, "type": "resync", "data": {"revision": revision}}]
+            else:
+                replay = sorted(score_events(rows) + judge_events(judges), key=lambda event: event["id"])
+        
+        response = app.response_class(
+            stream(broker, subscription, replay, STREAM_HEARTBEAT_SECONDS, STREAM_MAX_AGE_SECONDS),
+            mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        # Keep proxies from buffering the stream
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    except Exception as e:
+        logger.error(f"Error opening stream: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/export', methods=['GET'])
+def export_scores():
+    try:
+        fmt = request.args.get('format', 'csv')
+        if fmt not in ('csv', 'ndjson'):
+            return jsonify({"error": "format must be csv or ndjson"}), 400
+        
+        judges = sorted(judge for (judge,) in db.session.query(Score.judge).distinct())
+        # Ordered so each team's scores arrive together, teams in numeric order
+        rows = db.session.query(Score.team, Score.judge, Score.score).order_by(
+            func.length(Score.team), Score.team, Score.judge).yield_per(EXPORT_BATCH_SIZE)
+        
+        def teams():
+            for team, group in itertools.groupby(rows, key=lambda row: row[0]):
+                scores = {judge: score for _, judge, score in group if score is not None}
+                average = round(sum(scores.values()) / len(scores), 4) if scores else None
+                yield team, scores, average
+        
+        def generate():
+            if fmt == 'ndjson':
+                for team, scores, average in teams():
+                    yield json.dumps({"team": team, "scores": scores, "average": average}) + '\n'
+                return
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(['team'] + judges + ['average'])
+            for team, scores, average in teams():
+                writer.writerow([team] + [scores.get(judge, '') for judge in judges] +
+                                ['' if average is None else average])
+                if buffer.tell() >= 65536:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+        
+        mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'text/csv'
+        response = app.response_class(stream_with_context(generate()), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename=scores.{fmt}'
+        return response
+    except Exception as e:
+        logger.error(f"Error exporting scores: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/import', methods=['POST'])
+def import_scores_route():
+    try:
+        fmt = request.args.get('format')
+        if fmt is None:
+            fmt = 'ndjson' if 'json' in (request.mimetype or '') else 'csv'
+        if fmt not in ('csv', 'ndjson'):
+            return jsonify({"error": "format must be csv or ndjson"}), 400
+        
+        count = [0]
+        revision = import_scores(validated_rows(read_import(request.stream, fmt), count), count)
+        if revision is None:
+            # Nothing changed, so nothing to announce; a resync would reload every scoreboard
+            db.session.rollback()
+            return jsonify({
+                "message": "No scores to import",
+                "count": 0,
+                "revision": current_revision()[0]
+            })
+        # Too many rows for one event; open scoreboards refetch instead
+        announce('resync', revision, {"revision": revision, "count": count[0]})
+        db.session.commit()
+        log_event("scores_imported", count=count[0], revision=revision)
+        
+        return jsonify({
+            "message": "Scores imported successfully!",
+            "count": count[0],
+            "revision": revision
         }), 201
     
-    except ValueError:
-        logger.error("Invalid score value provided")
-        return jsonify({"error": "Invalid score value"}), 400
+    except InvalidScore as e:
+        logger.error(f"Invalid import data: {str(e)}")
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        logger.error(f"Error submitting score: {str(e)}")
+        logger.error(f"Error importing scores: {str(e)}")
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
@@ -175,24 +875,68 @@ def submit_score():
 def clear_scores():
     try:
         logger.info("Clearing all scores and judges...")
-        # with get_db_connection() as conn:
-        #     with conn.cursor() as cur:
-        #         cur.execute("DELETE FROM score;")
-        #     conn.commit()
+        revision, _ = next_revision()
+        truncated = False
+        if db.engine.dialect.name == 'postgresql':
+            # TRUNCATE waits for every open reader, e.g. a running /api/export, while
+            # this transaction holds the revision lock all writes queue behind. Give
+            # up on it quickly and DELETE instead, which readers do not block.
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(text("SET LOCAL lock_timeout = '1s'"))
+                    db.session.execute(text("TRUNCATE score, reservation, judge"))
+                truncated = True
+            except OperationalError:
+                logger.info("Scores are being read; clearing with DELETE instead of TRUNCATE")
+            db.session.execute(text("SET LOCAL lock_timeout TO DEFAULT"))
+        if not truncated:
+            db.session.execute(text("DELETE FROM score"))
+            db.session.execute(text("DELETE FROM reservation"))
+            db.session.execute(text("DELETE FROM judge"))
+        db.session.execute(ScoreRevision.__table__.update().where(ScoreRevision.id == 1).values(
+            reset_revision=revision))
+        announce('resync', revision, {"revision": revision, "count": 0})
+        db.session.commit()
+        return jsonify({"message": "All scores cleared", "revision": revision})
     except Exception as e:
         logger.error(f"Error clearing scores: {str(e)}")
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
 # Static file serving (should be last)
+static_assets = StaticAssets(STATIC_FOLDER)
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
-    if path and os.path.exists(os.path.join(app.static_folder, path)):
-        return send_from_directory(app.static_folder, path)
+    asset = static_assets.get(path or 'index.html')
+    if asset is None:
+        return jsonify({"error": "Frontend build not found"}), 404
+    
+    encoding = negotiate(asset, request.accept_encodings)
+    body, etag = asset.variants[encoding]
+    response = app.response_class(mimetype=asset.mimetype)
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    if static_assets.is_fingerprinted(asset):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    elif asset is static_assets.index:
+        # New deploys must reach judges quickly; revalidation is a cheap 304
+        response.headers['Cache-Control'] = 'public, max-age=60, must-revalidate'
     else:
-        return send_from_directory(app.static_folder, 'index.html')
+        response.headers['Cache-Control'] = 'public, max-age=3600'
+    
+    if request.if_none_match.contains_weak(etag):
+        response.status_code = 304
+        return response
+    response.set_data(body)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    return response
 
 if __name__ == '__main__':
+    # Local runs set up the schema themselves; deployments run `flask --app app init-db`
+    with app.app_context():
+        ensure_schema()
     port = int(os.environ.get('PORT', 5001))
     app.run(host='0.0.0.0', port=port)
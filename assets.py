@@ -0,0 +1,104 @@
+"""In-memory manifest and precompressed variants of the built SPA in static/.
+
+The directory is listed once at boot, so serving a request never stats the
+filesystem. Each file is read, hashed and compressed the first time it is
+requested; the entrypoints named in asset-manifest.json are warmed at boot.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Files smaller than this gain nothing from compression
+MIN_COMPRESS_SIZE = 512
+# Levels for variants compressed at runtime, when the build shipped no .br/.gz.
+# Maximum levels take seconds on large bundles and source maps.
+BROTLI_QUALITY = 5
+GZIP_LEVEL = 6
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml',
+                      'application/manifest+json', 'image/x-icon', 'image/vnd.microsoft.icon')
+
+
+class Asset:
+    def __init__(self, path, filename):
+        self.path = path
+        self.filename = filename
+        self.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        self.loaded = False
+        self.lock = threading.Lock()
+        # encoding ('identity', 'br', 'gzip') -> (body, etag)
+        self.variants = {}
+
+    def load(self):
+        with open(self.filename, 'rb') as f:
+            body = f.read()
+        digest = hashlib.sha256(body).hexdigest()[:20]
+        self.variants['identity'] = (body, digest)
+        if len(body) >= MIN_COMPRESS_SIZE and self.mimetype.startswith(COMPRESSIBLE_TYPES):
+            # Prefer variants produced by the build, next to the original
+            for encoding, suffix, compress in (
+                    ('br', '.br', brotli and (lambda data: brotli.compress(data, quality=BROTLI_QUALITY))),
+                    ('gzip', '.gz', lambda data: gzip.compress(data, GZIP_LEVEL))):
+                if os.path.exists(self.filename + suffix):
+                    with open(self.filename + suffix, 'rb') as f:
+                        compressed = f.read()
+                elif compress:
+                    compressed = compress(body)
+                else:
+                    continue
+                if len(compressed) < len(body):
+                    self.variants[encoding] = (compressed, f"{digest}-{encoding}")
+        self.loaded = True
+
+
+class StaticAssets:
+    def __init__(self, root):
+        self.root = root
+        self.assets = {}
+        for directory, _, filenames in os.walk(root):
+            for name in filenames:
+                if name.endswith(('.gz', '.br')):
+                    continue
+                filename = os.path.join(directory, name)
+                path = os.path.relpath(filename, root).replace(os.sep, '/')
+                self.assets[path] = Asset(path, filename)
+        self.index = self.assets.get('index.html')
+
+        try:
+            with open(os.path.join(root, 'asset-manifest.json')) as f:
+                entrypoints = json.load(f).get('entrypoints', [])
+        except (OSError, ValueError):
+            entrypoints = []
+        for path in ['index.html'] + entrypoints:
+            if path in self.assets:
+                self.get(path)
+
+    def get(self, path):
+        # Unknown paths are client-side routes and get the app shell
+        asset = self.assets.get(path, self.index)
+        if asset is not None and not asset.loaded:
+            # Per asset, so a slow file does not hold up the others
+            with asset.lock:
+                if not asset.loaded:
+                    asset.load()
+        return asset
+
+    @staticmethod
+    def is_fingerprinted(asset):
+        # The CRA build puts content-hashed names under static/
+        return asset.path.startswith('static/')
+
+
+def negotiate(asset, accept_encodings):
+    # accept_encodings is the request's parsed Accept-Encoding header
+    for encoding in ('br', 'gzip'):
+        if encoding in asset.variants and accept_encodings[encoding]:
+            return encoding
+    return 'identity'
@@ -0,0 +1,116 @@
+"""Show that bulk import and export run in flat memory as the table grows.
+
+For each size, a fresh interpreter imports ROWS scores through
+POST /api/import from a generated CSV stream, then another exports them
+through GET /api/export. Each phase reports its time and peak Python heap
+(measured with tracemalloc, which also slows the timings down):
+
+    python benchmarks/bench_bulk.py [--rows 100000,1000000] [--database-url URL]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PHASE = """
+import json, logging, sys, time, tracemalloc
+phase, rows, fmt = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+import app
+logging.disable(logging.WARNING)
+client = app.app.test_client()
+judges = 1000 if rows >= 1000000 else 100
+
+
+def upload_lines():
+    yield "judge,team,score\\n"
+    for i in range(rows):
+        yield f"Judge {i % judges},Team {i // judges},{(i * 7 % 31) / 10}\\n"
+
+
+class GeneratedUpload:
+    # Produces the upload as it is read, so the benchmark holds no copy of it
+    def __init__(self):
+        self.lines = upload_lines()
+        self.pending = ""
+
+    def read(self, size=-1):
+        size = size if size and size > 0 else 65536
+        while len(self.pending) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.pending += line
+        chunk, self.pending = self.pending[:size], self.pending[size:]
+        return chunk.encode()
+
+    def readline(self, size=-1):
+        while "\\n" not in self.pending:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.pending += line
+        end = self.pending.find("\\n") + 1 or len(self.pending)
+        if size and size > 0:
+            end = min(end, size)
+        chunk, self.pending = self.pending[:end], self.pending[end:]
+        return chunk.encode()
+
+
+with app.app.app_context():
+    app.ensure_schema()
+tracemalloc.start()
+start = time.perf_counter()
+if phase == 'import':
+    # The test client wants a seekable body, so hand the WSGI app the stream directly
+    environ = EnvironBuilder(path='/api/import', method='POST', content_type='text/csv').get_environ()
+    environ['wsgi.input'] = GeneratedUpload()
+    environ['CONTENT_LENGTH'] = str(sum(len(line) for line in upload_lines()))
+    body, status, _ = run_wsgi_app(app.app, environ, buffered=True)
+    body = b"".join(body)
+    assert status.startswith('201'), body
+    size = json.loads(body)['count']
+else:
+    response = client.get(f'/api/export?format={fmt}', buffered=False)
+    size = sum(len(chunk) for chunk in response.response)
+    response.close()
+elapsed = time.perf_counter() - start
+peak = tracemalloc.get_traced_memory()[1]
+print(json.dumps({"seconds": elapsed, "size": size, "peak_mb": peak / 1024 / 1024}))
+"""
+
+
+def run_phase(env, phase, rows, fmt='csv'):
+    result = subprocess.run([sys.executable, '-c', PHASE, phase, str(rows), fmt], cwd=ROOT, env=env,
+                            capture_output=True, text=True)
+    if result.returncode:
+        raise SystemExit(f"{phase} of {rows} rows failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='100000,1000000', help="comma-separated table sizes")
+    parser.add_argument('--database-url', help="scratch database; defaults to a fresh SQLite file per size")
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'phase':14} {'seconds':>9} {'peak heap':>12}")
+    for rows in (int(size) for size in args.rows.split(',')):
+        url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bulk.db')}"
+        env = dict(os.environ, DATABASE_URL=url)
+        if args.database_url:
+            subprocess.run([sys.executable, '-c', 'import app\nwith app.app.app_context():\n'
+                            '    app.ensure_schema()\n    app.clear_scores()'],
+                           cwd=ROOT, env=env, check=True, capture_output=True)
+        for phase, fmt in (('import', 'csv'), ('export', 'csv'), ('export', 'ndjson')):
+            result = run_phase(env, phase, rows, fmt)
+            label = phase if phase == 'import' else f"export {fmt}"
+            print(f"{rows:9d} {label:14} {result['seconds']:9.1f} {result['peak_mb']:9.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Compare the incremental leaderboard with a naive full-scan aggregate.
+
+Seeds a throwaway SQLite database with TEAMS x JUDGES scores, then alternates
+single score writes with leaderboard reads and times both strategies:
+
+    python benchmarks/bench_leaderboard.py [--teams 500] [--judges 100] [--rounds 50]
+"""
+import argparse
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def naive_leaderboard(Score):
+    by_team, by_judge = {}, {}
+    for score in Score.query.all():
+        by_team.setdefault(score.team, {})[score.judge] = score.score
+        by_judge.setdefault(score.judge, []).append(score.score)
+    judge_norm = {}
+    for judge, scores in by_judge.items():
+        mean = sum(scores) / len(scores)
+        std = math.sqrt(max(sum(s * s for s in scores) / len(scores) - mean * mean, 0.0))
+        judge_norm[judge] = (mean, std)
+    entries = []
+    for team, scores in by_team.items():
+        values = list(scores.values())
+        z = sum((s - judge_norm[j][0]) / judge_norm[j][1] for j, s in scores.items() if judge_norm[j][1] >= 1e-9)
+        entries.append({
+            "team": team,
+            "mean": sum(values) / len(values),
+            "count": len(values),
+            "min": min(values),
+            "max": max(values),
+            "normalized": z / len(values),
+        })
+    entries.sort(key=lambda entry: (-entry["mean"], entry["team"]))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--teams', type=int, default=500)
+    parser.add_argument('--judges', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    import app as judging
+    logging.disable(logging.INFO)
+
+    rng = random.Random(0)
+    with judging.app.app_context():
+        judging.ensure_schema()
+        rows = [{"judge": f"Judge {j}", "team": f"Team {t}", "score": round(rng.uniform(0, 3), 1)}
+                for j in range(args.judges) for t in range(args.teams)]
+        judging.upsert_scores(rows)
+        judging.db.session.commit()
+        print(f"seeded {len(rows)} scores ({args.teams} teams x {args.judges} judges)")
+
+        start = time.perf_counter()
+        # current_revision() is (revision, updated_at, reset_revision)
+        judging.sync_aggregates(*judging.current_revision()[::2])
+        print(f"incremental cold load: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        naive_total = incremental_total = 0.0
+        for _ in range(args.rounds):
+            judging.upsert_scores([{
+                "judge": f"Judge {rng.randrange(args.judges)}",
+                "team": f"Team {rng.randrange(args.teams)}",
+                "score": round(rng.uniform(0, 3), 1),
+            }])
+            judging.db.session.commit()
+
+            start = time.perf_counter()
+            expected = naive_leaderboard(judging.Score)
+            naive_total += time.perf_counter() - start
+
+            start = time.perf_counter()
+            judging.sync_aggregates(*judging.current_revision()[::2])
+            ranking = judging.aggregates.ranking('mean')
+            incremental_total += time.perf_counter() - start
+
+            # Compare per team; float summation order can reorder exact ties
+            got = {entry["team"]: entry for entry in ranking}
+            for want in expected:
+                entry = got[want["team"]]
+                assert (want["count"], want["min"], want["max"]) == (entry["count"], entry["min"], entry["max"])
+                assert math.isclose(want["mean"], entry["mean"], abs_tol=1e-9)
+                assert math.isclose(want["normalized"], entry["normalized"], abs_tol=1e-6)
+
+    naive_ms = naive_total / args.rounds * 1000
+    incremental_ms = incremental_total / args.rounds * 1000
+    print(f"naive full scan:       {naive_ms:8.2f} ms per read after a write")
+    print(f"incremental:           {incremental_ms:8.2f} ms per read after a write")
+    print(f"speedup:               {naive_ms / incremental_ms:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Measure app import time and first-request latency against a large table.
+
+Seeds a throwaway SQLite database with ROWS scores, then starts fresh
+interpreters that import the app and serve their first requests:
+
+    python benchmarks/bench_startup.py [--rows 500000] [--runs 5]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, logging, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+logging.disable(logging.INFO)
+client = app.app.test_client()
+assert client.get('/healthz').status_code == 200
+healthy = time.perf_counter()
+assert client.get('/api/scores', headers={'If-None-Match': '"scores-1"'}).status_code == 304
+conditional = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "healthz_ms": (healthy - imported) * 1000,
+    "scores_304_ms": (conditional - healthy) * 1000,
+}))
+"""
+
+
+def seed(url, path, rows):
+    env = dict(os.environ, DATABASE_URL=url)
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'],
+                   cwd=ROOT, env=env, check=True, capture_output=True)
+    judges = max(rows // 1000, 1)
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO score (judge, team, score, revision) VALUES (?, ?, ?, 1)",
+        ((f"Judge {i % judges}", f"Team {i // judges}", (i * 7 % 31) / 10) for i in range(rows)))
+    conn.execute("UPDATE score_revision SET value = 1 WHERE id = 1")
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    url = f"sqlite:///{path}"
+    seed(url, path, args.rows)
+    print(f"seeded {args.rows} scores")
+
+    env = dict(os.environ, DATABASE_URL=url)
+    results = []
+    for _ in range(args.runs):
+        probe = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+                               check=True, capture_output=True, text=True)
+        results.append(json.loads(probe.stdout.strip().splitlines()[-1]))
+
+    for key in results[0]:
+        values = [result[key] for result in results]
+        print(f"{key:15} median {statistics.median(values):8.1f} ms   max {max(values):8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
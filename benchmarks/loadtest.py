@@ -0,0 +1,350 @@
+"""Load test the judging API and record latency, throughput and query counts.
+
+Serves the app under gunicorn with the repo's gunicorn.conf.py, seeds a
+synthetic event through the API and drives a weighted mix of API calls from
+concurrent clients spread over separate processes, so the load generator
+never competes with the app for the GIL:
+
+    python benchmarks/loadtest.py --teams 300 --judges 80 --concurrency 16 --duration 20
+    python benchmarks/loadtest.py --workers 2 --threads 16 --client-processes 4
+    python benchmarks/loadtest.py --output results.json
+    python benchmarks/loadtest.py --baseline results.json --tolerance 0.25
+
+Without --database-url a throwaway SQLite database is used. A Postgres URL
+(e.g. postgresql://localhost/judging_bench) should point at a scratch
+database, since seeding writes real rows. Queries per request come from the
+app's own /metrics. With --baseline the run exits non-zero when any route's
+p95 latency regresses past the tolerance.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = "post_scores=40,get_scores=30,get_judges=20,post_judges=10"
+# Absolute slack so sub-millisecond routes do not fail on scheduler noise
+REGRESSION_SLACK_MS = 2.0
+
+
+class Operations:
+    """Builds the request for each named operation in the mix.
+
+    Each client thread passes its own rng, so runs are reproducible per seed.
+    """
+
+    def __init__(self, teams, judges, prefix=''):
+        self.teams = [f"Team {number}" for number in range(1, teams + 1)]
+        self.judges = [f"Judge {number}" for number in range(1, judges + 1)]
+        # Keeps judges added by different client processes apart
+        self.prefix = prefix
+        self.new_judges = 0
+        self.lock = threading.Lock()
+
+    def score(self, rng):
+        return {"judge": rng.choice(self.judges), "team": rng.choice(self.teams),
+                "score": round(rng.uniform(0, 3), 1)}
+
+    def post_scores(self, rng):
+        return 'POST', '/api/scores', self.score(rng)
+
+    def post_scores_batch(self, rng):
+        judge = rng.choice(self.judges)
+        return 'POST', '/api/scores/batch', [
+            {"judge": judge, "team": team, "score": round(rng.uniform(0, 3), 1)}
+            for team in rng.sample(self.teams, min(5, len(self.teams)))]
+
+    def get_scores(self, rng):
+        return 'GET', '/api/scores', None
+
+    def get_leaderboard(self, rng):
+        return 'GET', '/api/leaderboard?limit=20', None
+
+    def get_judges(self, rng):
+        return 'GET', '/api/judges', None
+
+    def post_judges(self, rng):
+        with self.lock:
+            self.new_judges += 1
+            judge = f"Load Judge {self.prefix}{self.new_judges}"
+        return 'POST', '/api/judges', {"judge": judge}
+
+
+def query_totals(port):
+    # (requests, queries) per "METHOD route" from the app's judging_request_queries histogram
+    from prometheus_client.parser import text_string_to_metric_families
+
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    conn.request('GET', '/metrics')
+    body = conn.getresponse().read().decode()
+    conn.close()
+    totals = {}
+    for family in text_string_to_metric_families(body):
+        if family.name != 'judging_request_queries':
+            continue
+        for sample in family.samples:
+            route = f"{sample.labels['method']} {sample.labels['route']}"
+            requests, queries = totals.get(route, (0, 0))
+            if sample.name.endswith('_count'):
+                totals[route] = (requests + sample.value, queries)
+            elif sample.name.endswith('_sum'):
+                totals[route] = (requests, queries + sample.value)
+    return totals
+
+
+def queries_per_request(before, after, method, path):
+    route = f"{method} {path.split('?')[0]}"
+    requests, queries = (a - b for a, b in zip(after.get(route, (0, 0)), before.get(route, (0, 0))))
+    return queries / requests if requests else None
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if not hasattr(Operations, name.strip()):
+            raise SystemExit(f"Unknown operation in mix: {name}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def seed(port, teams, judges, rng):
+    rows = [{"judge": f"Judge {j}", "team": f"Team {t}", "score": round(rng.uniform(0, 3), 1)}
+            for j in range(1, judges + 1) for t in range(1, teams + 1)]
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    for start in range(0, len(rows), 5000):
+        conn.request('POST', '/api/scores/batch', body=json.dumps(rows[start:start + 5000]),
+                     headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        response.read()
+        if response.status != 201:
+            raise SystemExit(f"Seeding failed with HTTP {response.status}")
+    conn.close()
+    return len(rows)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve(env, workdir, workers, threads):
+    # The schema step the Procfile runs on release, then the Procfile's web process
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'],
+                   cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+    port = free_port()
+    env = dict(env, PROMETHEUS_MULTIPROC_DIR=tempfile.mkdtemp(dir=workdir))
+    if workers:
+        env['WEB_CONCURRENCY'] = str(workers)
+    if threads:
+        env['GUNICORN_THREADS'] = str(threads)
+    log = open(os.path.join(workdir, 'gunicorn.log'), 'w')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                               '--bind', f'127.0.0.1:{port}', 'app:app'],
+                              cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"gunicorn exited; see {log.name}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/healthz')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return server, port
+        except OSError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise SystemExit(f"gunicorn did not become healthy; see {log.name}")
+
+
+def run_clients(port, teams, judges, names, weights, duration, seeds):
+    # One client process: a thread per seed, all sharing this process's Operations
+    operations = Operations(teams, judges, prefix=f"{os.getpid()}-")
+    deadline = time.monotonic() + duration
+    samples = []
+    threads = [threading.Thread(target=client, args=(port, operations, names, weights, deadline, samples,
+                                                     random.Random(seed)))
+               for seed in seeds]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def client(port, operations, names, weights, deadline, samples, rng):
+    # Keep-alive so the measurement is the app, not TCP setup
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, path, payload = getattr(operations, name)(rng)
+        body = json.dumps(payload) if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body else {}
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            ok = response.status < 500
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            ok = False
+        samples.append((name, method, path, (time.perf_counter() - start) * 1000, ok))
+    conn.close()
+
+
+def summarize(samples, elapsed, before, after):
+    routes = {}
+    for name in sorted({sample[0] for sample in samples}):
+        matching = [sample for sample in samples if sample[0] == name]
+        latencies = [sample[3] for sample in matching]
+        _, method, path, _, _ = matching[0]
+        routes[name] = {
+            "route": f"{method} {path.split('?')[0]}",
+            "requests": len(matching),
+            "errors": sum(1 for sample in matching if not sample[4]),
+            "throughput_rps": len(matching) / elapsed,
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "queries_per_request": queries_per_request(before, after, method, path),
+        }
+    return routes
+
+
+def incomparable(results, baseline):
+    # Settings that differ between this run and the baseline, which make p95s incomparable
+    keys = sorted(set(results["config"]) | set(baseline.get("config", {})))
+    differences = [f"{key}: {baseline.get('config', {}).get(key)!r} -> {results['config'].get(key)!r}"
+                   for key in keys if baseline.get("config", {}).get(key) != results["config"].get(key)]
+    if baseline.get("database") != results["database"]:
+        differences.append(f"database: {baseline.get('database')!r} -> {results['database']!r}")
+    return differences
+
+
+def check_regressions(routes, baseline, tolerance):
+    failures = []
+    for name, result in routes.items():
+        previous = baseline.get("routes", {}).get(name)
+        if not previous or previous.get("p95_ms") is None:
+            continue
+        limit = previous["p95_ms"] * (1 + tolerance) + REGRESSION_SLACK_MS
+        if result["p95_ms"] > limit:
+            failures.append(f"{name}: p95 {result['p95_ms']:.1f} ms > {limit:.1f} ms "
+                            f"(baseline {previous['p95_ms']:.1f} ms)")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help="defaults to a throwaway SQLite database")
+    parser.add_argument('--teams', type=int, default=300)
+    parser.add_argument('--judges', type=int, default=80)
+    parser.add_argument('--concurrency', type=int, default=16, help="client threads in total")
+    parser.add_argument('--client-processes', type=int, default=min(os.cpu_count() or 1, 4),
+                        help="processes the client threads are spread over")
+    parser.add_argument('--workers', type=int, help="gunicorn workers (default: gunicorn.conf.py)")
+    parser.add_argument('--threads', type=int, help="threads per worker (default: gunicorn.conf.py)")
+    parser.add_argument('--duration', type=float, default=20, help="seconds")
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help=f"weighted operations (default {DEFAULT_MIX}); also post_scores_batch, "
+                             "get_leaderboard")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--baseline', help="fail if p95 latency regresses against this results file")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed p95 slowdown against the baseline (default 0.25 = 25%%)")
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+    workdir = tempfile.mkdtemp(prefix='judging-loadtest-')
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'loadtest.db')}"
+    database = database_url.split(':')[0].split('+')[0]
+    env = dict(os.environ, DATABASE_URL=database_url, LOG_LEVEL='WARNING')
+    server, port = serve(env, workdir, args.workers, args.threads)
+    try:
+        seeded = seed(port, args.teams, args.judges, random.Random(args.seed))
+        print(f"seeded {seeded} scores ({args.teams} teams x {args.judges} judges) on {database}")
+
+        names, weight_values = list(weights), list(weights.values())
+        processes = max(1, min(args.client_processes, args.concurrency))
+        seeds = [args.seed + index for index in range(args.concurrency)]
+        before = query_totals(port)
+        started = time.perf_counter()
+        with ProcessPoolExecutor(processes) as pool:
+            batches = pool.map(run_clients, *zip(*[
+                (port, args.teams, args.judges, names, weight_values, args.duration, seeds[index::processes])
+                for index in range(processes)]))
+            samples = [sample for batch in batches for sample in batch]
+        elapsed = time.perf_counter() - started
+        after = query_totals(port)
+    finally:
+        server.terminate()
+        server.wait()
+
+    routes = summarize(samples, elapsed, before, after)
+    results = {
+        "timestamp": datetime.utcnow().isoformat() + 'Z',
+        "python": platform.python_version(),
+        "database": database,
+        "config": dict({key: getattr(args, key) for key in ('teams', 'judges', 'concurrency', 'duration', 'mix')},
+                       workers=args.workers, threads=args.threads, client_processes=processes),
+        "total_requests": len(samples),
+        "throughput_rps": len(samples) / elapsed,
+        "routes": routes,
+    }
+
+    print(f"{'operation':18} {'reqs':>7} {'err':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'queries':>8}")
+    for name, result in routes.items():
+        queries = result['queries_per_request']
+        print(f"{name:18} {result['requests']:7d} {result['errors']:5d} {result['throughput_rps']:8.1f} "
+              f"{result['p50_ms']:8.1f} {result['p95_ms']:8.1f} {result['p99_ms']:8.1f} "
+              f"{queries if queries is not None else float('nan'):8.1f}")
+    print(f"total: {len(samples)} requests, {results['throughput_rps']:.1f} req/s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        differences = incomparable(results, baseline)
+        if differences:
+            for difference in differences:
+                print(f"baseline differs in {difference}")
+            raise SystemExit(f"{args.baseline} was recorded with different settings; not comparing")
+        failures = check_regressions(routes, baseline, args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+        print("no regressions against baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""Fan-out of live score events to Server-Sent Events subscribers.
+
+Every worker runs one EventBroker. Writes reach it either directly (SQLite and
+other single-process setups) or through a PostgresListener that relays
+LISTEN/NOTIFY messages, so one database notification feeds every open stream
+in the worker.
+"""
+import collections
+import json
+import logging
+import queue
+import select
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscription:
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize)
+        # Set when the subscriber fell too far behind and was cut off
+        self.overflowed = False
+
+
+class EventBroker:
+    def __init__(self, backlog=1000, queue_size=256, max_subscribers=500):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        # Recent events, oldest first, for Last-Event-ID resume
+        self.recent = collections.deque(maxlen=backlog)
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+
+    def publish(self, event):
+        with self.lock:
+            self.recent.append(event)
+            for subscription in list(self.subscribers):
+                try:
+                    subscription.queue.put_nowait(event)
+                except queue.Full:
+                    # A stalled consumer loses its stream rather than growing the queue
+                    subscription.overflowed = True
+                    self.subscribers.discard(subscription)
+
+    def subscribe(self, last_id=None):
+        # Returns the subscription and the buffered events after last_id, or
+        # None for the events when the buffer no longer reaches back that far
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                raise TooManySubscribers()
+            subscription = Subscription(self.queue_size)
+            self.subscribers.add(subscription)
+            if last_id is None:
+                return subscription, []
+            if self.recent and self.recent[0]["id"] <= last_id + 1:
+                return subscription, [event for event in self.recent if event["id"] > last_id]
+            return subscription, None
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+
+def format_event(event):
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+def stream(broker, subscription, replay, heartbeat=15, max_age=300):
+    # Ends after max_age seconds so a forgotten tab cannot pin a worker thread;
+    # EventSource reconnects on its own and resumes from the last event id
+    try:
+        for event in replay:
+            yield format_event(event)
+        deadline = time.monotonic() + max_age
+        while not subscription.overflowed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                event = subscription.queue.get(timeout=min(heartbeat, remaining))
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+class PostgresListener:
+    """Relays NOTIFY payloads on `channel` into a broker from a daemon thread."""
+
+    def __init__(self, broker, connect, channel, expand=None, resync=None):
+        self.broker = broker
+        self.connect = connect
+        self.channel = channel
+        # Optional hook to rebuild events whose payload was too large to NOTIFY
+        self.expand = expand
+        # Optional hook returning the event that tells subscribers to refetch
+        # after a reconnect, since notifications sent in the gap are lost
+        self.resync = resync
+        self.reconnecting = False
+        # Set while LISTEN is active
+        self.listening = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self, timeout=5):
+        # Started on first use rather than at import so forked workers each get their own.
+        # Waits for LISTEN, so a subscriber that replays from the table right after
+        # cannot miss notifications sent in between.
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='pg-listener', daemon=True)
+                self.thread.start()
+        if not self.listening.wait(timeout):
+            # Subscribers go ahead without it; they get a resync once it is listening
+            self.reconnecting = True
+
+    def run(self):
+        while True:
+            try:
+                self.listen()
+            except Exception as e:
+                logger.error(f"Event listener lost its connection: {str(e)}")
+                self.listening.clear()
+                self.reconnecting = True
+                time.sleep(1)
+
+    def listen(self):
+        conn = self.connect()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {self.channel};")
+            self.listening.set()
+            if self.reconnecting and self.resync:
+                # Listening again first, so nothing after this event is missed
+                self.broker.publish(self.resync())
+            self.reconnecting = False
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    event = json.loads(conn.notifies.pop(0).payload)
+                    if self.expand:
+                        event = self.expand(event)
+                    self.broker.publish(event)
+        finally:
+            conn.close()
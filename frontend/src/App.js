@@ -28,115 +28,37 @@ const calculateAverage = (scores) => {
   return (sum / validScores.length).toFixed(2);
 };
 
-const getUnseenTeams = (availableTeams, seenTeams) => {
-  const unseenTeams = availableTeams.filter(team => !seenTeams.includes(team));
-  console.log('Unseen teams:', unseenTeams);
-  return unseenTeams;
-};
-
-// Add Fisher-Yates shuffle function
-const shuffleArray = (array) => {
-  for (let i = array.length - 1; i > 0; i--) {
-    const j = Math.floor(Math.random() * (i + 1));
-    [array[i], array[j]] = [array[j], array[i]];
-  }
-  return array;
-};
-
-const getTeamsToAssign = (availableTeams, seenTeamsByJudge, judgeSeenTeams, currentTeamsByJudge, currentJudge, teamRange) => {
-  console.log('Getting teams to assign for judge:', currentJudge);
-  console.log('Judge seen teams:', judgeSeenTeams);
-  console.log('All available teams:', availableTeams);
-  console.log('Current team range:', teamRange);
-  
-  // Filter teams to only include those within the current range
-  const teamsInRange = availableTeams.filter(team => {
-    const teamNum = parseInt(team.split(' ')[1]);
-    const isInRange = teamNum >= teamRange.start && teamNum <= teamRange.end;
-    console.log(`Team ${team}: ${isInRange ? 'in range' : 'out of range'}`);
-    return isInRange;
-  });
-  
-  console.log('Teams within range:', teamsInRange);
-  
-  // Get all teams this judge hasn't seen yet
-  const judgeUnseenTeams = teamsInRange.filter(team => {
-    const hasSeen = judgeSeenTeams.includes(team);
-    console.log(`Team ${team}: ${hasSeen ? 'seen' : 'unseen'}`);
-    return !hasSeen;
-  });
-  
-  console.log('Judge unseen teams:', judgeUnseenTeams);
-  
-  // Get currently assigned teams across all judges, excluding the current judge
-  const currentlyAssignedTeams = new Set();
-  Object.entries(currentTeamsByJudge).forEach(([judge, teams]) => {
-    if (judge !== currentJudge) {  // Don't count teams assigned to the current judge
-      teams.forEach(team => currentlyAssignedTeams.add(team));
-    }
-  });
-  
-  console.log('Currently assigned teams:', Array.from(currentlyAssignedTeams));
-
-  // Count how many times each unseen team has been judged
-  const teamJudgmentCounts = {};
-  judgeUnseenTeams.forEach(team => {
-    teamJudgmentCounts[team] = Object.values(seenTeamsByJudge).filter(judgeTeams => judgeTeams.includes(team)).length;
-  });
-  
-  console.log('Team judgment counts:', teamJudgmentCounts);
-
-  // Sort unseen teams by judgment count (least judged first)
-  const sortedUnseenTeams = [...judgeUnseenTeams].sort((a, b) => {
-    const countDiff = teamJudgmentCounts[a] - teamJudgmentCounts[b];
-    return countDiff === 0 ? parseInt(a.split(' ')[1]) - parseInt(b.split(' ')[1]) : countDiff;
-  });
-  
-  console.log('Sorted unseen teams:', sortedUnseenTeams);
-
-  // If we have 5 or more teams available, just take 5 regardless of range or current assignments
-  if (sortedUnseenTeams.length >= 5) {
-    const assignedTeams = shuffleArray([...sortedUnseenTeams])
-      .slice(0, 5)
-      .sort((a, b) => parseInt(a.split(' ')[1]) - parseInt(b.split(' ')[1]));
-    console.log('Assigned teams (5+ available):', assignedTeams);
-    return assignedTeams;
-  }
-
-  // If we have fewer than 5 teams, try to find teams within range
-  let assignedTeams = [];
-  for (let i = 0; i < sortedUnseenTeams.length && assignedTeams.length === 0; i++) {
-    const startTeam = parseInt(sortedUnseenTeams[i].split(' ')[1]);
-    const teamsInRange = sortedUnseenTeams.filter(team => {
-      const teamNum = parseInt(team.split(' ')[1]);
-      return Math.abs(teamNum - startTeam) <= 9;
+// Ask the server for the judge's next batch; it reserves the teams so
+// judges assigned at the same time get different ones
+const fetchAssignedTeams = async (judge, teamRange) => {
+  try {
+    const params = new URLSearchParams({ judge, start: teamRange.start, end: teamRange.end });
+    const response = await fetch(`${BACKEND_URL}/api/assignments/next?${params}`, {
+      method: 'POST'
     });
 
-    if (teamsInRange.length >= 5) {
-      // If we found 5 or more teams in range, shuffle and take 5
-      assignedTeams = shuffleArray([...teamsInRange])
-        .slice(0, 5)
-        .sort((a, b) => parseInt(a.split(' ')[1]) - parseInt(b.split(' ')[1]));
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
     }
-  }
 
-  // If we couldn't find 5 teams in range, just take all available teams
-  if (assignedTeams.length === 0 && sortedUnseenTeams.length > 0) {
-    assignedTeams = sortedUnseenTeams
-      .sort((a, b) => parseInt(a.split(' ')[1]) - parseInt(b.split(' ')[1]));
+    const data = await response.json();
+    console.log('Assigned teams for judge:', judge, data.teams);
+    return data.teams;
+  } catch (error) {
+    console.error(`Error assigning teams to ${judge}:`, error);
+    return [];
   }
-
-  console.log('Final assigned teams:', assignedTeams);
-  return assignedTeams;
 };
 
-// Add error handling for score submission
-const submitScore = async (judge, team, score) => {
+// Submit a judge's whole panel in one request
+const submitScores = async (judge, teams, scores) => {
   try {
-    const response = await fetch(`${BACKEND_URL}/api/scores`, {
+    const response = await fetch(`${BACKEND_URL}/api/scores/batch`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ judge, team, score })
+      body: JSON.stringify({
+        scores: teams.map((team, i) => ({ judge, team, score: scores[i] }))
+      })
     });
 
     if (!response.ok) {
@@ -146,7 +68,7 @@ const submitScore = async (judge, team, score) => {
     const data = await response.json();
     return data;
   } catch (error) {
-    console.error(`Error submitting score for ${team} by ${judge}:`, error);
+    console.error(`Error submitting scores by ${judge}:`, error);
     throw error; // Re-throw to handle in the calling function
   }
 };
@@ -360,6 +282,66 @@ function App() {
     loadData();
   }, []); // Only run once on mount
 
+  // Apply score writes and new judges pushed by the server
+  useEffect(() => {
+    let source;
+    let retry;
+    let lastEventId = null;
+    const connect = () => {
+      // A stream reopened by hand resumes where the last one stopped
+      source = new EventSource(lastEventId === null
+        ? `${BACKEND_URL}/api/stream`
+        : `${BACKEND_URL}/api/stream?lastEventId=${encodeURIComponent(lastEventId)}`);
+
+      source.addEventListener('scores', (event) => {
+        lastEventId = event.lastEventId;
+        const scores = JSON.parse(event.data).scores || [];
+        setScoreTableData(prev => {
+          const updated = { ...prev };
+          scores.forEach(({ team, judge, score }) => {
+            updated[team] = { ...(updated[team] || {}), [judge]: score };
+          });
+          return updated;
+        });
+        setSeenTeamsByJudge(prev => {
+          const updated = { ...prev };
+          scores.forEach(({ team, judge }) => {
+            const seen = updated[judge] || [];
+            if (!seen.includes(team)) {
+              updated[judge] = [...seen, team];
+            }
+          });
+          return updated;
+        });
+        setJudges(prev => [...new Set([...prev, ...scores.map(({ judge }) => judge)])].sort((a, b) => a.localeCompare(b)));
+      });
+
+      source.addEventListener('judge', (event) => {
+        lastEventId = event.lastEventId;
+        const { judge } = JSON.parse(event.data);
+        setJudges(prev => prev.includes(judge) ? prev : [...prev, judge].sort((a, b) => a.localeCompare(b)));
+      });
+
+      // Bulk imports and resets are announced without their rows; reload the table
+      source.addEventListener('resync', () => {
+        window.location.reload();
+      });
+
+      // A full server refuses the stream with a 503, which EventSource does not retry
+      source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) {
+          retry = setTimeout(connect, 30000);
+        }
+      };
+    };
+    connect();
+
+    return () => {
+      clearTimeout(retry);
+      source.close();
+    };
+  }, []);
+
   // Add logging to useEffect for team assignments
   useEffect(() => {
     if (currentJudge) {
@@ -370,23 +352,22 @@ function App() {
       const needsNewTeams = currentTeams.length < 5;
 
       if (!currentTeamsByJudge[currentJudge] || needsNewTeams) {
-        const judgeSeenTeams = seenTeamsByJudge[currentJudge] || [];
-        console.log('Judge seen teams:', judgeSeenTeams);
-        const teamsToAssign = getTeamsToAssign(teams, seenTeamsByJudge, judgeSeenTeams, currentTeamsByJudge, currentJudge, teamRange);
-        console.log('Teams to assign:', teamsToAssign);
-        
-        if (teamsToAssign.length > 0) {
-          setCurrentTeamsByJudge(prev => {
-            const updated = { ...prev, [currentJudge]: teamsToAssign };
-            console.log('Updated currentTeamsByJudge:', updated);
-            return updated;
-          });
-          setScoresByJudge(prev => {
-            const updated = { ...prev, [currentJudge]: Array(teamsToAssign.length).fill("") };
-            console.log('Updated scoresByJudge:', updated);
-            return updated;
-          });
-        }
+        fetchAssignedTeams(currentJudge, teamRange).then(teamsToAssign => {
+          console.log('Teams to assign:', teamsToAssign);
+          
+          if (teamsToAssign.length > 0) {
+            setCurrentTeamsByJudge(prev => {
+              const updated = { ...prev, [currentJudge]: teamsToAssign };
+              console.log('Updated currentTeamsByJudge:', updated);
+              return updated;
+            });
+            setScoresByJudge(prev => {
+              const updated = { ...prev, [currentJudge]: Array(teamsToAssign.length).fill("") };
+              console.log('Updated scoresByJudge:', updated);
+              return updated;
+            });
+          }
+        });
       }
     }
   }, [currentJudge, teamRange]); // Add teamRange to dependencies
@@ -406,8 +387,7 @@ function App() {
     const needsNewTeams = currentTeams.length < 5;
 
     if (!currentTeamsByJudge[selectedJudge] || needsNewTeams) {
-      const judgeSeenTeams = seenTeamsByJudge[selectedJudge] || [];
-      const teamsToAssign = getTeamsToAssign(teams, seenTeamsByJudge, judgeSeenTeams, currentTeamsByJudge, selectedJudge, teamRange);
+      const teamsToAssign = await fetchAssignedTeams(selectedJudge, teamRange);
       
       if (teamsToAssign.length > 0) {
         setCurrentTeamsByJudge(prev => ({ ...prev, [selectedJudge]: teamsToAssign }));
@@ -430,8 +410,7 @@ function App() {
       setJudges(updatedJudges);
       
       // Check if there are any unseen teams
-      const judgeSeenTeams = seenTeamsByJudge[newJudge] || [];
-      const teamsToAssign = getTeamsToAssign(teams, seenTeamsByJudge, judgeSeenTeams, currentTeamsByJudge, newJudge, teamRange);
+      const teamsToAssign = await fetchAssignedTeams(newJudge, teamRange);
       
       // Only assign teams if there are teams to assign
       if (teamsToAssign.length > 0) {
@@ -496,13 +475,8 @@ function App() {
       
       console.log('Submitting scores for teams:', teamsWithScores);
       
-      // Submit all scores in parallel
-      const scorePromises = teamsWithScores.map((team, i) => 
-        submitScore(currentJudge, team, parseFloat(validScores[i]))
-      );
-      
-      // Wait for all scores to be submitted
-      await Promise.all(scorePromises);
+      // Submit all scores in a single batch
+      await submitScores(currentJudge, teamsWithScores, validScores.map(score => parseFloat(score)));
 
       // Update the score table with submitted scores
       const newScoreTable = { ...scoreTableData };
@@ -571,9 +545,9 @@ function App() {
           method: 'DELETE'
         });
 
-        // if (!response.ok) {
-        //   throw new Error('Failed to clear scores from database');
-        // }
+        if (!response.ok) {
+          throw new Error('Failed to clear scores from database');
+        }
 
         alert('All judges have been reset successfully!');
       } catch (error) {
@@ -0,0 +1,38 @@
+# Read by gunicorn from the working directory; see Procfile
+import glob
+import os
+import tempfile
+
+# Workers write metrics here and /metrics aggregates them. It has to be set
+# before the app (and prometheus_client) is imported.
+if not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='judging-metrics-')
+
+# Import the app once in the master and fork workers from it. Importing the
+# app opens no database connections, so nothing is shared across the fork.
+preload_app = True
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+# Each open /api/stream holds one thread for up to STREAM_MAX_AGE_SECONDS.
+# app.py keeps API_RESERVED_THREADS (default 8) per worker for the API and
+# refuses streams beyond the rest, so the defaults serve 2 x (16 - 8) = 16 open
+# scoreboards. For hundreds raise GUNICORN_THREADS: idle stream threads only
+# wait on a queue, e.g. WEB_CONCURRENCY=2 GUNICORN_THREADS=158 serves 300.
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '16'))
+
+
+def post_fork(server, worker):
+    # Belt and braces: discard any pool inherited from the master
+    from app import db
+    db.engine.dispose()
+
+
+def on_starting(server):
+    # Samples left by a previous run would be summed into this one
+    for path in glob.glob(os.path.join(os.environ['PROMETHEUS_MULTIPROC_DIR'], '*.db')):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
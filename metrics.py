@@ -0,0 +1,94 @@
+"""Prometheus request and SQL metrics.
+
+When PROMETHEUS_MULTIPROC_DIR is set (gunicorn.conf.py sets it) each worker
+writes samples to files in that directory and /metrics sums every worker.
+"""
+import logging
+import os
+import time
+
+from flask import g, has_request_context, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_SECONDS = float(os.getenv('SLOW_QUERY_SECONDS', '0.25'))
+
+REQUEST_LATENCY = Histogram(
+    'judging_request_duration_seconds', 'Time to produce a response', ['method', 'route'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+REQUESTS = Counter('judging_requests_total', 'Responses by status', ['method', 'route', 'status'])
+IN_FLIGHT = Gauge('judging_requests_in_flight', 'Requests being handled', multiprocess_mode='livesum')
+REQUEST_QUERIES = Histogram(
+    'judging_request_queries', 'SQL statements per request', ['method', 'route'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100))
+QUERY_LATENCY = Histogram(
+    'judging_query_duration_seconds', 'SQL statement latency',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+SLOW_QUERIES = Counter('judging_slow_queries_total', 'SQL statements slower than SLOW_QUERY_SECONDS',
+                       ['route'])
+
+
+def route_label():
+    # The matched rule, not the raw path, keeps label cardinality bounded
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def init_app(app):
+    @app.before_request
+    def start_request():
+        g.metrics_start = time.perf_counter()
+        g.metrics_queries = 0
+        IN_FLIGHT.inc()
+
+    @app.after_request
+    def record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        if 'metrics_start' not in g:
+            return
+        IN_FLIGHT.dec()
+        method, route = request.method, route_label()
+        REQUEST_LATENCY.labels(method, route).observe(time.perf_counter() - g.metrics_start)
+        REQUESTS.labels(method, route, str(g.get('metrics_status', 500))).inc()
+        REQUEST_QUERIES.labels(method, route).observe(g.metrics_queries)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def finish_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    QUERY_LATENCY.observe(elapsed)
+    route = None
+    if has_request_context() and 'metrics_queries' in g:
+        g.metrics_queries += 1
+        route = route_label()
+    if elapsed >= SLOW_QUERY_SECONDS:
+        SLOW_QUERIES.labels(route or 'background').inc()
+        logger.warning("slow query %.3fs on %s: %.200s", elapsed, route or 'background', statement)
+
+
+@event.listens_for(Engine, 'handle_error')
+def abandon_query(context):
+    # Failed statements never reach after_cursor_execute
+    if context.connection is not None and context.connection.info.get('query_start'):
+        context.connection.info['query_start'].pop()
+
+
+def render():
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
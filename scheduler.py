@@ -0,0 +1,37 @@
+"""Choose the next batch of teams for a judge.
+
+Same rules as the old client-side assignment: least-judged teams first,
+BATCH_SIZE per batch, and teams kept within LOCALITY numbers of each other
+when enough of them are available.
+"""
+import heapq
+import random
+
+BATCH_SIZE = 5
+LOCALITY = 9
+
+
+def team_number(team):
+    try:
+        return int(str(team).split(' ')[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+def team_range(start, end):
+    return [f"Team {number}" for number in range(start, end + 1)]
+
+
+def pick_teams(teams, counts, seen, size=BATCH_SIZE, rng=random):
+    # counts: team -> judgments plus live reservations by other judges
+    candidates = [team for team in teams if team not in seen]
+    if len(candidates) <= size:
+        return sorted(candidates, key=team_number)
+
+    # Random tie-break so judges with identical coverage spread out
+    keys = {team: (counts.get(team, 0), rng.random()) for team in candidates}
+    anchor = min(candidates, key=keys.__getitem__)
+    nearby = [team for team in candidates
+              if abs(team_number(team) - team_number(anchor)) <= LOCALITY]
+    pool = nearby if len(nearby) >= size else candidates
+    return sorted(heapq.nsmallest(size, pool, key=keys.__getitem__), key=team_number)